@@ -11,8 +11,18 @@ VK Cloud (OpenStack) — бесконечно выделяет floating IP из
 Поддерживает параллельную работу нескольких воркеров.
 """
 
+import atexit
+import bisect
+import concurrent.futures
+from datetime import datetime, timezone
 import ipaddress
+import json
+import logging
+import logging.handlers
+import queue
 import os
+import socket
+import struct
 import sys
 import time
 import threading
@@ -29,6 +39,9 @@ except ImportError:
 from openstack import connection
 from openstack import exceptions as os_exc
 from keystoneauth1 import exceptions as ks_exc
+from keystoneauth1 import loading as ks_loading
+from keystoneauth1 import session as ks_session
+from requests.adapters import HTTPAdapter
 
 # Опциональная поддержка уведомлений через apprise
 try:
@@ -70,13 +83,27 @@ def get_auth():
 SERVER_ID_OR_NAME = os.getenv("VKCLOUD_SERVER_ID_OR_NAME")
 EXT_NET_NAME = os.getenv("VKCLOUD_EXT_NET_NAME")  # None если не задано
 PORT_ID = os.getenv("VKCLOUD_PORT_ID")  # None если не задано
+# Отвязывать ли от порта уже привязанный floating IP (иначе скрипт остановится с ошибкой)
+DETACH_EXISTING = os.getenv("VKCLOUD_DETACH_EXISTING", "false").lower() == "true"
 SLEEP_BETWEEN_ATTEMPTS = float(os.getenv("VKCLOUD_SLEEP_BETWEEN_ATTEMPTS", "0.6"))
 ASSOC_WAIT = float(os.getenv("VKCLOUD_ASSOC_WAIT", "8.0"))
 TARGET_NET_STR = os.getenv("VKCLOUD_TARGET_NET", "95.163.248.0/22")
 # Поддержка нескольких подсетей через запятую
 TARGET_NETS_STR_LIST = [net.strip() for net in TARGET_NET_STR.split(",") if net.strip()]
 TARGET_NETS = [ipaddress.ip_network(net) for net in TARGET_NETS_STR_LIST]
+# Пересекающиеся и смежные подсети схлопываем в минимальный набор (по версиям IP)
+TARGET_NETS = [
+    net
+    for version in (4, 6)
+    for net in ipaddress.collapse_addresses(n for n in TARGET_NETS if n.version == version)
+]
+TARGET_NETS_DISPLAY = ", ".join(str(net) for net in TARGET_NETS)
 WORKERS_COUNT = int(os.getenv("VKCLOUD_WORKERS_COUNT", "1"))
+# Сколько floating IP каждый воркер выделяет параллельно за одну попытку
+BATCH_SIZE = int(os.getenv("VKCLOUD_BATCH_SIZE", "1"))
+# Размер общего пула HTTP-соединений (рассчитан на одновременные запросы всех воркеров)
+HTTP_POOL_CONNECTIONS = max(10, WORKERS_COUNT * 2)
+HTTP_POOL_MAXSIZE = max(20, WORKERS_COUNT * BATCH_SIZE * 4)
 
 # Режим последовательного перебора IP внутри диапазона
 SEQUENTIAL_IP_SCAN = os.getenv("VKCLOUD_SEQUENTIAL_IP_SCAN", "false").lower() == "true"
@@ -85,51 +112,154 @@ SEQUENTIAL_IP_SCAN = os.getenv("VKCLOUD_SEQUENTIAL_IP_SCAN", "false").lower() ==
 WORK_DURATION_MINUTES = os.getenv("VKCLOUD_WORK_DURATION_MINUTES")  # Время работы в минутах (None = без ограничений)
 PAUSE_DURATION_MINUTES = os.getenv("VKCLOUD_PAUSE_DURATION_MINUTES")  # Время паузы в минутах (None = без паузы)
 
+def parse_minutes(value):
+    """Преобразует число минут из переменной окружения (None, если не задано или не число)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+# Разобранные значения (проверяются в main(), в цикле работы не пересчитываются)
+WORK_DURATION = parse_minutes(WORK_DURATION_MINUTES)
+PAUSE_DURATION = parse_minutes(PAUSE_DURATION_MINUTES)
+
+# Кэш id внешней сети, найденной авто-поиском (по project_id)
+EXT_NET_CACHE_FILE = os.path.expanduser("~/.cache/vkcloud_ext_net_id")
+EXT_NET_CACHE_TTL = 24 * 60 * 60  # Через сутки сеть ищется заново
+
+# Уровень логирования сообщений скрипта (INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("VKCLOUD_LOG_LEVEL", "INFO").upper()
+
 # Уведомления через apprise (опционально)
 APPRISE_URL = os.getenv("VKCLOUD_APPRISE_URL")  # URL для уведомлений через apprise
 
+# За сколько секунд до истечения токена Keystone он обновляется заранее
+TOKEN_REFRESH_MARGIN = 60
+
+log = logging.getLogger("vkcloud")
+
 # Глобальная переменная для остановки всех воркеров
 stop_event = threading.Event()
 success_lock = threading.Lock()
-success_achieved = False
-success_ip = None
-success_worker_id = None
+success_result = None  # (IP, номер воркера) победителя; выставляется один раз под success_lock
 
 # Глобальные переменные для режима работы по расписанию
 pause_event = threading.Event()
-work_start_time = None
-work_start_lock = threading.Lock()
+work_deadline = None  # Момент окончания работы текущего цикла (по time.monotonic())
+
+# Объект Apprise создаётся один раз при запуске (None, если уведомления не настроены)
+if APPRISE_AVAILABLE and APPRISE_URL:
+    apprise_obj = Apprise()
+    apprise_obj.add(APPRISE_URL)
+else:
+    apprise_obj = None
+
+# Уведомления отправляются фоновым потоком, чтобы не задерживать воркеры (None — сигнал завершения)
+notify_queue = queue.SimpleQueue()
+NOTIFY_FLUSH_TIMEOUT = 10  # Сколько секунд при выходе ждём отправки оставшихся уведомлений
+
+# Блокировка обновления общего токена (переавторизуется только один воркер)
+token_lock = threading.Lock()
+
+# Фоновое освобождение неподходящих IP: DELETE идёт параллельно с паузой между попытками.
+# Воркер ждёт удалений своего прошлого пакета перед новым, поэтому их не больше WORKERS_COUNT × BATCH_SIZE
+cleanup_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(2, WORKERS_COUNT * BATCH_SIZE))
+cleanup_futures = set()  # Ещё не завершённые удаления (дожидаемся их в конце цикла)
+cleanup_lock = threading.Lock()
+worker_threads = []  # Потоки воркеров текущего цикла (дожидаемся их и при Ctrl+C)
 
 # Глобальные переменные для последовательного перебора IP
 ip_iterators = {}  # Словарь итераторов для каждой подсети
 ip_iterators_lock = threading.Lock()
 
+# Целевые подсети в виде отсортированных непересекающихся диапазонов целых чисел
+# (начало, конец) — для проверки IP через bisect без создания объектов ipaddress.
+# collapse_addresses уже вернул подсети отсортированными и без пересечений
+TARGET_NETS_V4 = [net for net in TARGET_NETS if net.version == 4]
+TARGET_RANGES = [(int(net.network_address), int(net.broadcast_address)) for net in TARGET_NETS_V4]
+TARGET_RANGE_STARTS = [lo for lo, _ in TARGET_RANGES]
+# IPv6-подсети редки, их проверяем через ipaddress
+TARGET_NETS_V6 = [net for net in TARGET_NETS if net.version == 6]
+# Обычный случай — одна целевая подсеть: достаточно наложить её маску
+if len(TARGET_NETS_V4) == 1:
+    TARGET_MASK = int(TARGET_NETS_V4[0].netmask)
+    TARGET_BASE = int(TARGET_NETS_V4[0].network_address)
+else:
+    TARGET_MASK = TARGET_BASE = None
+# IPv4 адрес в сетевом порядке байт -> uint32
+IPV4_UNPACK = struct.Struct("!I").unpack
+
 # ========= ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =========
-def get_conn(auth_config=None) -> connection.Connection:
-    """Создает новое соединение с OpenStack."""
-    if auth_config is None:
-        auth_config = get_auth()
-    conn = connection.Connection(**auth_config)
+def get_session(auth_config: dict) -> ks_session.Session:
+    """Создает общую для всех воркеров сессию Keystone с пулом HTTP-соединений."""
+    # Токен хранится в сессии и обновляется keystoneauth автоматически,
+    # а TLS-соединения переиспользуются всеми воркерами
+    auth = ks_loading.get_plugin_loader("password").load_from_options(
+        auth_url=auth_config["auth_url"],
+        username=auth_config["username"],
+        password=auth_config["password"],
+        project_id=auth_config["project_id"],
+        user_domain_name=auth_config["user_domain_name"],
+    )
+    sess = ks_session.Session(auth=auth, verify=auth_config.get("verify", True))
+    # При нехватке соединений запрос ждёт свободное, а не открывает и выбрасывает новое
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=True,
+    )
+    sess.session.mount("https://", adapter)
+    sess.session.mount("http://", adapter)
+    return sess
+
+def ensure_token_fresh(sess: ks_session.Session, stale_auth_ref=None):
+    """Обновляет токен общей сессии, только если он истекает или был отклонён API."""
+    # stale_auth_ref — токен, получивший 401: если другой воркер уже успел
+    # его заменить, повторной авторизации не будет
+    auth_ref = sess.auth.auth_ref
+    if (auth_ref is not None and auth_ref is not stale_auth_ref
+            and not auth_ref.will_expire_soon(TOKEN_REFRESH_MARGIN)):
+        return auth_ref
+    with token_lock:
+        auth_ref = sess.auth.auth_ref
+        if (auth_ref is None or auth_ref is stale_auth_ref
+                or auth_ref.will_expire_soon(TOKEN_REFRESH_MARGIN)):
+            sess.invalidate()
+            sess.get_token()
+        return sess.auth.auth_ref
+
+def get_conn(sess: ks_session.Session, auth_config: dict) -> connection.Connection:
+    """Создает соединение с OpenStack поверх общей сессии."""
+    conn = connection.Connection(
+        session=sess,
+        region_name=auth_config["region_name"],
+        interface=auth_config["interface"],
+    )
     # поднимет исключение, если авторизация не удалась
     conn.authorize()
     return conn
 
-def ensure_conn_alive(conn: connection.Connection) -> connection.Connection:
-    """Проверяет, что токен жив; при невалидности — пересоздаёт соединение."""
-    try:
-        conn.authorize()
-        return conn
-    except (ks_exc.Unauthorized, ks_exc.NotFound):
-        # токен протух/невалиден — пересобираем коннект
-        return get_conn()
-
 def in_target_range(ip: str) -> bool:
     """Проверяет, принадлежит ли IP одной из целевых подсетей."""
     try:
-        ip_addr = ipaddress.ip_address(ip)
-        return any(ip_addr in net for net in TARGET_NETS)
+        # inet_pton, в отличие от inet_aton, не принимает сокращённые формы вроде "1.2.3"
+        value = IPV4_UNPACK(socket.inet_pton(socket.AF_INET, ip))[0]
+    except (OSError, TypeError):
+        return in_target_range_v6(ip) if TARGET_NETS_V6 else False
+    if TARGET_MASK is not None:
+        return value & TARGET_MASK == TARGET_BASE
+    idx = bisect.bisect_right(TARGET_RANGE_STARTS, value) - 1
+    return idx >= 0 and value <= TARGET_RANGES[idx][1]
+
+def in_target_range_v6(ip: str) -> bool:
+    """Проверяет, принадлежит ли IPv6-адрес одной из целевых подсетей."""
+    try:
+        addr = ipaddress.ip_address(ip)
     except ValueError:
         return False
+    return any(addr in net for net in TARGET_NETS_V6)
 
 def find_server(conn: connection.Connection, server_id_or_name: str):
     srv = conn.compute.find_server(server_id_or_name, ignore_missing=True)
@@ -137,6 +267,16 @@ def find_server(conn: connection.Connection, server_id_or_name: str):
         raise SystemExit(f"❌ ВМ '{server_id_or_name}' не найдена")
     return conn.compute.get_server(srv.id)
 
+def port_created_at(port) -> datetime:
+    """Время создания порта (порты без корректной даты — в конец списка)."""
+    created_at = getattr(port, "created_at", None)
+    try:
+        created = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return datetime.max.replace(tzinfo=timezone.utc)
+    # Neutron может вернуть время без зоны — это UTC
+    return created if created.tzinfo else created.replace(tzinfo=timezone.utc)
+
 def pick_port(conn: connection.Connection, server, explicit_port_id=None):
     if explicit_port_id:
         port = conn.network.get_port(explicit_port_id)
@@ -145,38 +285,131 @@ def pick_port(conn: connection.Connection, server, explicit_port_id=None):
         if port.device_id != server.id:
             raise SystemExit("❌ Указанный порт не принадлежит этой ВМ")
         return port
+    # активные порты фильтруем на стороне Neutron; порядок списка не гарантирован,
+    # поэтому берём самый старый — на ВМ с несколькими NIC выбор не меняется от запуска к запуску
+    active = list(conn.network.ports(device_id=server.id, status="ACTIVE"))
+    if active:
+        return min(active, key=port_created_at)
     ports = list(conn.network.ports(device_id=server.id))
     if not ports:
         raise SystemExit("❌ У ВМ нет сетевых портов")
-    # активные первыми
-    ports.sort(key=lambda p: (p.status != "ACTIVE", getattr(p, "created_at", "")))
-    return ports[0]
+    return min(ports, key=port_created_at)
 
-def find_external_network(conn: connection.Connection, name_or_id: str | None):
+def check_port_fips(conn: connection.Connection, port) -> str | None:
+    """Проверяет FIP, уже привязанные к порту. Возвращает подходящий IP, если он уже есть."""
+    existing = list(conn.network.ips(port_id=port.id))
+    if not existing:
+        return None
+    for fip in existing:
+        if in_target_range(fip.floating_ip_address):
+            return fip.floating_ip_address
+    addresses = ", ".join(fip.floating_ip_address for fip in existing)
+    # С занятым портом каждая привязка закончится ошибкой, и поиск будет идти впустую
+    if not DETACH_EXISTING:
+        raise SystemExit(f"❌ Порт уже имеет FIP {addresses}. Отвяжите его или выберите другой порт "
+                         f"(или задайте VKCLOUD_DETACH_EXISTING=true).")
+    for fip in existing:
+        conn.network.update_ip(fip, port_id=None)
+    log.warning("🔓 От порта отвязан FIP: %s", addresses)
+    return None
+
+def load_ext_net_cache() -> dict:
+    """Читает кэш внешних сетей ({project_id: {"id": network_id, "saved_at": timestamp}})."""
+    try:
+        with open(EXT_NET_CACHE_FILE, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def save_ext_net_cache(project_id: str, network_id: str):
+    """Сохраняет id найденной внешней сети в кэш для проекта."""
+    cache = load_ext_net_cache()
+    cache[project_id] = {"id": network_id, "saved_at": time.time()}
+    write_ext_net_cache(cache)
+
+def write_ext_net_cache(cache: dict):
+    try:
+        os.makedirs(os.path.dirname(EXT_NET_CACHE_FILE), exist_ok=True)
+        with open(EXT_NET_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        log.warning("⚠️ Не удалось сохранить кэш внешней сети: %s", e)
+
+def cached_ext_net_id(project_id: str) -> str | None:
+    """Возвращает id внешней сети из кэша, если запись не старше EXT_NET_CACHE_TTL."""
+    entry = load_ext_net_cache().get(project_id)
+    if not isinstance(entry, dict):
+        return None
+    saved_at = entry.get("saved_at")
+    if not isinstance(saved_at, (int, float)) or time.time() - saved_at > EXT_NET_CACHE_TTL:
+        return None
+    return entry.get("id")
+
+def forget_ext_net_cache(network_id: str):
+    """Удаляет из кэша записи, указывающие на сеть network_id."""
+    cache = load_ext_net_cache()
+    stale = [project_id for project_id, entry in cache.items()
+             if isinstance(entry, dict) and entry.get("id") == network_id]
+    if not stale:
+        return
+    for project_id in stale:
+        del cache[project_id]
+    write_ext_net_cache(cache)
+
+def find_external_network(conn: connection.Connection, name_or_id: str | None,
+                          project_id: str | None = None):
     if name_or_id:
         return conn.network.find_network(name_or_id, ignore_missing=False)
+    # сеть, найденную авто-поиском при прошлом запуске, берём по id из кэша
+    cached_id = cached_ext_net_id(project_id) if project_id else None
+    if cached_id:
+        try:
+            net = conn.network.get_network(cached_id)
+            if getattr(net, "is_router_external", False):
+                return net
+        except os_exc.NotFoundException:
+            pass
     # авто-поиск первой внешней сети (router:external)
-    for net in conn.network.networks():
+    for net in conn.network.networks(is_router_external=True):
         if getattr(net, "is_router_external", False):
+            if project_id:
+                save_ext_net_cache(project_id, net.id)
             return net
     raise SystemExit("❌ Внешняя сеть не найдена. Укажите EXT_NET_NAME явно.")
 
+def neutron_request(conn: connection.Connection, method: str, url: str, **kwargs):
+    """Выполняет запрос к Neutron напрямую, минуя объектную модель SDK."""
+    # conn.network — адаптер keystoneauth с уже найденным endpoint'ом сети,
+    # поэтому на каждый вызов нет ни поиска endpoint'а, ни создания Resource
+    response = conn.network.request(url, method, **kwargs)
+    os_exc.raise_from_response(response)
+    return response
+
 def allocate_fip(conn: connection.Connection, ext_net_id: str, specific_ip: str = None):
-    """Выделяет floating IP. Если указан specific_ip, пытается выделить именно этот IP."""
+    """Выделяет floating IP и возвращает (id, адрес). Если указан specific_ip, пытается выделить именно этот IP."""
+    body = {"floating_network_id": ext_net_id}
     if specific_ip:
+        body["floating_ip_address"] = specific_ip
         try:
             # Пытаемся выделить конкретный IP адрес
-            return conn.network.create_ip(
-                floating_network_id=ext_net_id,
-                floating_ip_address=specific_ip
-            )
+            response = neutron_request(conn, "POST", "/floatingips", json={"floatingip": body})
+            fip = response.json()["floatingip"]
+            return fip["id"], fip.get("floating_ip_address")
         except Exception:
             # Если не удалось выделить конкретный IP, возвращаем None
             # Вызывающий код должен обработать это и попробовать без указания IP
             return None
     else:
         # Обычное выделение случайного IP
-        return conn.network.create_ip(floating_network_id=ext_net_id)
+        try:
+            response = neutron_request(conn, "POST", "/floatingips", json={"floatingip": body})
+        except os_exc.NotFoundException:
+            # Внешней сети больше нет — её id из кэша не должен достаться следующему запуску
+            forget_ext_net_cache(ext_net_id)
+            raise
+        fip = response.json()["floatingip"]
+        return fip["id"], fip.get("floating_ip_address")
 
 def get_next_ip_from_networks():
     """Генерирует следующий IP адрес для перебора из целевых подсетей."""
@@ -225,41 +458,114 @@ def get_next_ip_from_networks():
         
         return None
 
-def associate_fip(conn: connection.Connection, fip, port):
-    return conn.network.update_ip(fip, port_id=port.id)
+def allocate_candidate(conn: connection.Connection, ext_net_id: str):
+    """Выделяет один floating IP с учётом режима перебора. Возвращает ((id, адрес), specific_ip)."""
+    specific_ip = None
+    if SEQUENTIAL_IP_SCAN:
+        specific_ip = get_next_ip_from_networks()
+        if specific_ip:
+            # Пытаемся выделить конкретный IP
+            fip = allocate_fip(conn, ext_net_id, specific_ip)
+            if not fip:
+                # Не удалось выделить конкретный IP, пробуем обычным способом
+                fip = allocate_fip(conn, ext_net_id)
+        else:
+            # Итераторы закончились, используем обычный способ
+            fip = allocate_fip(conn, ext_net_id)
+    else:
+        # Обычный режим - случайный IP
+        fip = allocate_fip(conn, ext_net_id)
+    return fip, specific_ip
+
+def allocate_batch(conn: connection.Connection, ext_net_id: str, executor=None):
+    """Параллельно выделяет BATCH_SIZE floating IP. Возвращает список ((id, адрес), specific_ip)."""
+    if executor is None:
+        return [allocate_candidate(conn, ext_net_id)]
+    futures = [executor.submit(allocate_candidate, conn, ext_net_id) for _ in range(BATCH_SIZE)]
+    candidates = []
+    error = None
+    for future in futures:
+        try:
+            candidates.append(future.result())
+        except Exception as e:
+            error = error or e
+    if not candidates:
+        # Не выделено ни одного IP — пусть ошибку обработает воркер
+        raise error
+    if error:
+        log.warning("⚠️ Выделена только часть пакета (%d из %d): %s", len(candidates), BATCH_SIZE, error)
+    return candidates
+
+def associate_fip(conn: connection.Connection, fip_id: str, port_id: str):
+    response = neutron_request(conn, "PUT", f"/floatingips/{fip_id}",
+                               json={"floatingip": {"port_id": port_id}})
+    return response.json()["floatingip"]
 
 def release_fip(conn: connection.Connection, fip):
+    """Освобождает floating IP, заданный кортежем (id, адрес)."""
+    fip_id, ip = fip
     try:
-        conn.network.delete_ip(fip, ignore_missing=True)
+        neutron_request(conn, "DELETE", f"/floatingips/{fip_id}")
+    except os_exc.NotFoundException:
+        pass
     except Exception as e:
-        print(f"⚠️ Ошибка удаления IP {getattr(fip, 'floating_ip_address', '?')}: {e}", file=sys.stderr)
+        log.warning("⚠️ Ошибка удаления IP %s: %s", ip or "?", e)
+
+def release_fips(conn: connection.Connection, fips) -> list:
+    """Освобождает floating IP в фоновом пуле. Возвращает futures запущенных удалений."""
+    futures = []
+    for fip in fips:
+        # При остановке пул может быть уже закрыт (выход интерпретатора) — удаляем сразу
+        if stop_event.is_set():
+            release_fip(conn, fip)
+            continue
+        try:
+            future = cleanup_executor.submit(release_fip, conn, fip)
+        except RuntimeError:
+            release_fip(conn, fip)
+            continue
+        with cleanup_lock:
+            cleanup_futures.add(future)
+        future.add_done_callback(forget_cleanup)
+        futures.append(future)
+    return futures
+
+def forget_cleanup(future):
+    with cleanup_lock:
+        cleanup_futures.discard(future)
+
+def drain_cleanup():
+    """Дожидается завершения всех фоновых удалений IP."""
+    with cleanup_lock:
+        pending = list(cleanup_futures)
+    concurrent.futures.wait(pending)
 
 def wait_for_association(conn: connection.Connection, fip_id: str, port_id: str,
-                         timeout: float = ASSOC_WAIT, poll: float = 0.5) -> bool:
+                         timeout: float = ASSOC_WAIT, poll: float = 0.05,
+                         max_poll: float = 1.0) -> bool:
+    """Ждёт привязки FIP к порту, опрашивая Neutron с экспоненциальной паузой."""
     waited = 0.0
     while waited < timeout:
-        # Проверяем, не нужно ли остановиться
-        if stop_event.is_set():
-            return False
-        f = conn.network.get_ip(fip_id)
-        if getattr(f, "port_id", None) == port_id:
+        f = neutron_request(conn, "GET", f"/floatingips/{fip_id}").json()["floatingip"]
+        if f.get("port_id") == port_id:
             return True
-        time.sleep(poll)
-        waited += poll
-        # Проверка после паузы
-        if stop_event.is_set():
+        # Пауза прерывается сразу, если другой воркер добился успеха
+        if stop_event.wait(poll):
             return False
+        waited += poll
+        # Быстрая привязка подтверждается за пару запросов, медленная — без лишних опросов
+        poll = min(poll * 2, max_poll)
     return False
 
 def send_notification(title: str, body: str, notification_type: str = "info"):
-    """Отправляет уведомление через apprise, если настроено."""
-    if not APPRISE_AVAILABLE or not APPRISE_URL:
+    """Ставит уведомление в очередь фоновой отправки, если apprise настроен."""
+    if apprise_obj is None:
         return
-    
+    notify_queue.put((title, body, notification_type))
+
+def deliver_notification(title: str, body: str, notification_type: str):
+    """Отправляет уведомление через apprise."""
     try:
-        apobj = Apprise()
-        apobj.add(APPRISE_URL)
-        
         # Определяем приоритет и иконку в зависимости от типа
         if notification_type == "success":
             body = f"✅ {body}"
@@ -268,227 +574,248 @@ def send_notification(title: str, body: str, notification_type: str = "info"):
         else:
             body = f"ℹ️ {body}"
         
-        apobj.notify(
+        apprise_obj.notify(
             body=body,
             title=title,
         )
     except Exception as e:
-        print(f"⚠️ Ошибка отправки уведомления: {e}", file=sys.stderr)
+        log.warning("⚠️ Ошибка отправки уведомления: %s", e)
+
+def notification_sender():
+    """Отправляет уведомления из очереди, пока не получит сигнал завершения."""
+    while True:
+        item = notify_queue.get()
+        if item is None:
+            return
+        deliver_notification(*item)
+
+def setup_notifications():
+    """Запускает фоновый поток отправки уведомлений."""
+    if apprise_obj is None:
+        return
+    sender = threading.Thread(target=notification_sender, name="notifier", daemon=True)
+    sender.start()
+
+    def flush():
+        # При выходе отправляем всё, что осталось в очереди (например, уведомление об успехе)
+        notify_queue.put(None)
+        sender.join(NOTIFY_FLUSH_TIMEOUT)
+
+    atexit.register(flush)
+
+def setup_logging():
+    """Настраивает логирование: сообщения в stdout, предупреждения и ошибки в stderr."""
+    if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+        raise SystemExit(f"❌ Неизвестный уровень логирования VKCLOUD_LOG_LEVEL: {LOG_LEVEL}")
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.addFilter(lambda record: record.levelno < logging.WARNING)
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setLevel(logging.WARNING)
+    # Воркеры только кладут записи в очередь, а в консоль их пишет отдельный поток,
+    # чтобы воркеры не ждали друг друга на блокировке вывода
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, stdout_handler, stderr_handler, respect_handler_level=True
+    )
+    # Уровень задаётся только логгеру скрипта: сторонние библиотеки (keystoneauth,
+    # urllib3, openstacksdk) пишут лишь предупреждения и ошибки
+    logging.basicConfig(level=logging.WARNING, format="%(message)s",
+                        handlers=[logging.handlers.QueueHandler(log_queue)])
+    log.setLevel(LOG_LEVEL)
+    listener.start()
+    # При выходе дописываем всё, что осталось в очереди
+    atexit.register(listener.stop)
 
 # ========= ОСНОВНОЙ СЦЕНАРИЙ =========
-def worker(worker_id: int, server_id_or_name: str, port_id: str, ext_net_id: str):
+def worker(worker_id: int, server_id_or_name: str, port_id: str, ext_net_id: str,
+           conn: connection.Connection, sess: ks_session.Session):
     """Функция воркера для параллельного поиска floating IP."""
-    global success_achieved, work_start_time
+    global success_result
     
-    auth_config = get_auth()
-    conn = get_conn(auth_config)
+    log.info("[Воркер %d] 🔗 Подключен к VK Cloud", worker_id)
     
-    print(f"[Воркер {worker_id}] 🔗 Подключен к VK Cloud")
+    # Пул потоков для параллельного выделения пакета IP
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_SIZE) if BATCH_SIZE > 1 else None
+    # Фоновые удаления неподходящих IP из прошлой попытки
+    pending_releases = []
+    # Токен, отклонённый API: заменяется в начале следующей попытки
+    auth_ref = stale_auth_ref = None
     
     while not stop_event.is_set():
         # Проверка времени работы (если включен режим работы по расписанию)
-        if WORK_DURATION_MINUTES:
-            with work_start_lock:
-                if work_start_time is None:
-                    work_start_time = time.time()
-                elapsed_minutes = (time.time() - work_start_time) / 60
-                if elapsed_minutes >= float(WORK_DURATION_MINUTES):
-                    print(f"[Воркер {worker_id}] ⏸️  Время работы истекло ({WORK_DURATION_MINUTES} мин), ожидаю паузу...")
-                    pause_event.set()
-                    break
+        if work_deadline is not None and time.monotonic() >= work_deadline:
+            log.info("[Воркер %d] ⏸️  Время работы истекло (%s мин), ожидаю паузу...", worker_id, WORK_DURATION_MINUTES)
+            pause_event.set()
+            break
         
         # Проверка паузы
         if pause_event.is_set():
             break
-        # Проверяем, не достиг ли успех другой воркер
-        with success_lock:
-            if success_achieved:
-                print(f"[Воркер {worker_id}] 🛑 Остановка: успех достигнут другим воркером")
-                break
-        
-        # Дополнительная проверка перед началом итерации
-        if stop_event.is_set():
-            break
-        
-        # Гарантируем живость токена перед каждой итерацией
-        conn = ensure_conn_alive(conn)
-        
-        # Проверка после переавторизации
-        if stop_event.is_set():
-            break
         
         fip = None
         try:
-            # Проверка перед выделением IP
+            # Токен кэшируется в общей сессии; Keystone дёргается только при истечении.
+            # Сбой Keystone обрабатывается ниже, как и любая ошибка попытки
+            auth_ref = ensure_token_fresh(sess, stale_auth_ref)
+            stale_auth_ref = None
+            
+            # Проверка перед выделением IP (пока обновлялся токен, другой воркер мог добиться успеха)
             if stop_event.is_set():
                 break
             
-            # 1) выделяем floating IP
-            specific_ip = None
-            if SEQUENTIAL_IP_SCAN:
-                specific_ip = get_next_ip_from_networks()
-                if specific_ip:
-                    # Пытаемся выделить конкретный IP
-                    fip = allocate_fip(conn, ext_net_id, specific_ip)
-                    if not fip:
-                        # Не удалось выделить конкретный IP, пробуем обычным способом
-                        fip = allocate_fip(conn, ext_net_id)
-                else:
-                    # Итераторы закончились, используем обычный способ
-                    fip = allocate_fip(conn, ext_net_id)
-            else:
-                # Обычный режим - случайный IP
-                fip = allocate_fip(conn, ext_net_id)
+            # 1) выделяем пакет floating IP, когда прошлый пакет уже удалён:
+            # иначе при медленном DELETE удерживаемых адресов становится всё больше
+            concurrent.futures.wait(pending_releases)
+            candidates = allocate_batch(conn, ext_net_id, executor)
             
-            ip = getattr(fip, "floating_ip_address", None)
-            if not ip:
-                print(f"[Воркер {worker_id}] ⚠️  Получен FIP без адреса — освобождаю и повторяю…")
-                release_fip(conn, fip)
-                fip = None
-                time.sleep(SLEEP_BETWEEN_ATTEMPTS)
-                continue
+            # 2) проверяем диапазон: первый подходящий IP оставляем, остальные освобождаем
+            misses = []
+            for candidate, specific_ip in candidates:
+                candidate_ip = candidate[1]
+                if not candidate_ip:
+                    log.info("[Воркер %d] ⚠️  Получен FIP без адреса — освобождаю и повторяю…", worker_id)
+                    misses.append(candidate)
+                    continue
 
-            if SEQUENTIAL_IP_SCAN and specific_ip:
-                print(f"[Воркер {worker_id}] 🔹 Выделен IP: {ip} (попытка выделить {specific_ip})")
-            else:
-                print(f"[Воркер {worker_id}] 🔹 Выделен IP: {ip}")
+                if SEQUENTIAL_IP_SCAN and specific_ip:
+                    log.info("[Воркер %d] 🔹 Выделен IP: %s (попытка выделить %s)", worker_id, candidate_ip, specific_ip)
+                else:
+                    log.info("[Воркер %d] 🔹 Выделен IP: %s", worker_id, candidate_ip)
+
+                if not in_target_range(candidate_ip):
+                    log.info("[Воркер %d] ❌ IP %s не из целевых подсетей (%s), удаляю…", worker_id, candidate_ip, TARGET_NETS_DISPLAY)
+                    misses.append(candidate)
+                elif fip is None:
+                    fip = candidate
+                    fip_id, ip = candidate
+                else:
+                    # Подходящий IP в пакете уже есть, второй не нужен
+                    misses.append(candidate)
+            pending_releases = release_fips(conn, misses)
 
             # Проверка после выделения IP
             if stop_event.is_set():
-                release_fip(conn, fip)
-                break
-
-            # 2) проверяем диапазон
-            if in_target_range(ip):
-                # Проверка перед привязкой - может другой воркер уже успел
-                if stop_event.is_set():
-                    release_fip(conn, fip)
-                    break
-                
-                target_nets_str = ", ".join(str(net) for net in TARGET_NETS)
-                print(f"[Воркер {worker_id}] ✅ IP {ip} принадлежит одной из подсетей ({target_nets_str}). Привязываю к порту {port_id}…")
-                port = conn.network.get_port(port_id)
-                associate_fip(conn, fip, port)
-
-                # Проверка после привязки
-                if stop_event.is_set():
+                if fip:
                     release_fip(conn, fip)
-                    break
+                break
 
-                # 3) ждём подтверждения привязки
-                if wait_for_association(conn, fip.id, port_id):
-                    global success_ip, success_worker_id
-                    with success_lock:
-                        if not success_achieved:
-                            success_achieved = True
-                            success_ip = ip
-                            success_worker_id = worker_id
-                            stop_event.set()
-                            print(f"[Воркер {worker_id}] 🎉 Привязка подтверждена. Готово!")
-                            print(f"[Воркер {worker_id}] 📌 Итоговый IP: {ip}")
-                            # Отправляем уведомление об успехе
-                            send_notification(
-                                "VK Cloud: Floating IP привязан",
-                                f"IP {ip} успешно привязан к ВМ воркером {worker_id}",
-                                "success"
-                            )
-                        else:
-                            # Другой воркер уже успел
-                            print(f"[Воркер {worker_id}] ⚠️ Другой воркер уже привязал IP, освобождаю…")
-                            release_fip(conn, fip)
+            if fip:
+                log.info("[Воркер %d] ✅ IP %s принадлежит одной из подсетей (%s). Привязываю к порту %s…", worker_id, ip, TARGET_NETS_DISPLAY, port_id)
+                associated = associate_fip(conn, fip_id, port_id)
+
+                # 3) ждём подтверждения привязки; обычно Neutron уже вернул port_id
+                # в ответе на PUT, и опрашивать его не нужно. Если другой воркер
+                # успел раньше, это решит захват success_lock ниже
+                if associated.get("port_id") == port_id or wait_for_association(conn, fip_id, port_id):
+                    # Неблокирующий захват: если замок занят, победитель уже определён
+                    won = False
+                    if success_lock.acquire(blocking=False):
+                        try:
+                            if success_result is None:
+                                success_result = (ip, worker_id)
+                                stop_event.set()
+                                won = True
+                        finally:
+                            success_lock.release()
+                    if won:
+                        log.info("[Воркер %d] 🎉 Привязка подтверждена. Готово!", worker_id)
+                        log.info("[Воркер %d] 📌 Итоговый IP: %s", worker_id, ip)
+                        # Отправляем уведомление об успехе
+                        send_notification(
+                            "VK Cloud: Floating IP привязан",
+                            f"IP {ip} успешно привязан к ВМ воркером {worker_id}",
+                            "success"
+                        )
+                    else:
+                        # Другой воркер уже успел
+                        log.info("[Воркер %d] ⚠️ Другой воркер уже привязал IP, освобождаю…", worker_id)
+                        release_fip(conn, fip)
                     break
                 else:
-                    print(f"[Воркер {worker_id}] ⚠️ Привязка не подтвердилась, освобождаю IP и продолжаю…")
+                    log.info("[Воркер %d] ⚠️ Привязка не подтвердилась, освобождаю IP и продолжаю…", worker_id)
                     release_fip(conn, fip)
                     fip = None
 
-            else:
-                target_nets_str = ", ".join(str(net) for net in TARGET_NETS)
-                print(f"[Воркер {worker_id}] ❌ IP {ip} не из целевых подсетей ({target_nets_str}), удаляю…")
-                release_fip(conn, fip)
-                fip = None
-
         except KeyboardInterrupt:
             # Пробрасываем KeyboardInterrupt наверх
             raise
 
         except (ks_exc.Unauthorized, ks_exc.NotFound) as e:
             # На всякий случай, если токен «упал» посреди операций
-            print(f"[Воркер {worker_id}] 🔁 Токен невалиден: {e}. Переавторизация…")
-            try:
-                if fip:
-                    release_fip(conn, fip)
-            finally:
-                conn = get_conn(auth_config)
+            log.info("[Воркер %d] 🔁 Токен невалиден: %s. Переавторизация…", worker_id, e)
+            if fip:
+                release_fip(conn, fip)
+            stale_auth_ref = auth_ref
 
         except os_exc.HttpException as e:
-            print(f"[Воркер {worker_id}] ⚠️ Ошибка API (HTTP): {e}", file=sys.stderr)
+            log.warning("[Воркер %d] ⚠️ Ошибка API (HTTP): %s", worker_id, e)
             if fip:
                 release_fip(conn, fip)
 
         except Exception as e:
             if not stop_event.is_set():
-                print(f"[Воркер {worker_id}] ⚠️ Неожиданная ошибка: {e}", file=sys.stderr)
+                log.warning("[Воркер %d] ⚠️ Неожиданная ошибка: %s", worker_id, e)
             if fip:
                 release_fip(conn, fip)
 
-        # Проверка перед паузой
-        if stop_event.is_set():
-            break
-        
-        time.sleep(SLEEP_BETWEEN_ATTEMPTS)
-        
-        # Проверка после паузы
-        if stop_event.is_set():
+        # Пауза между попытками; прерывается сразу, если другой воркер добился успеха
+        if stop_event.wait(SLEEP_BETWEEN_ATTEMPTS):
             break
     
+    if executor:
+        executor.shutdown(wait=False)
+    
     # Финальное сообщение при остановке
-    if stop_event.is_set() and not success_achieved:
-        print(f"[Воркер {worker_id}] 🛑 Остановлен")
-
-def run_work_cycle(server_id_or_name: str, port_id: str, ext_net_id: str):
-    """Запускает один цикл работы воркеров."""
-    global work_start_time, success_achieved, success_ip, success_worker_id, ip_iterators
+    if success_result is not None and success_result[1] != worker_id:
+        log.info("[Воркер %d] 🛑 Остановка: успех достигнут другим воркером", worker_id)
+    elif stop_event.is_set() and success_result is None:
+        log.info("[Воркер %d] 🛑 Остановлен", worker_id)
+
+def run_work_cycle(server_id_or_name: str, port_id: str, ext_net_id: str,
+                   conn: connection.Connection, sess: ks_session.Session):
+    """Запускает один цикл работы воркеров. Возвращает (IP, номер воркера) победителя или None."""
+    global work_deadline, success_result, ip_iterators
     
     # Сброс флагов для нового цикла
-    work_start_time = None
+    work_deadline = time.monotonic() + WORK_DURATION * 60 if WORK_DURATION is not None else None
     pause_event.clear()
     stop_event.clear()
-    success_achieved = False
-    success_ip = None
-    success_worker_id = None
+    success_result = None
     
     # Сброс итераторов IP при новом цикле (если включен последовательный перебор)
     if SEQUENTIAL_IP_SCAN:
         with ip_iterators_lock:
             ip_iterators.clear()
     
-    print("🚀 Запускаю параллельный поиск подходящего floating IP…")
+    log.info("🚀 Запускаю параллельный поиск подходящего floating IP…")
     if SEQUENTIAL_IP_SCAN:
-        print(f"🔢 Режим последовательного перебора IP: включен")
+        log.info("🔢 Режим последовательного перебора IP: включен")
     if WORK_DURATION_MINUTES:
-        print(f"⏱️  Режим работы по расписанию: работа {WORK_DURATION_MINUTES} мин, пауза {PAUSE_DURATION_MINUTES or 0} мин")
+        log.info("⏱️  Режим работы по расписанию: работа %s мин, пауза %s мин", WORK_DURATION_MINUTES, PAUSE_DURATION_MINUTES or 0)
     
     # Запускаем воркеры
-    threads = []
+    worker_threads.clear()
     for i in range(1, WORKERS_COUNT + 1):
         t = threading.Thread(
             target=worker,
-            args=(i, server_id_or_name, port_id, ext_net_id),
+            args=(i, server_id_or_name, port_id, ext_net_id, conn, sess),
             daemon=False
         )
         t.start()
-        threads.append(t)
-        time.sleep(0.1)  # Небольшая задержка между запусками
+        worker_threads.append(t)
     
     # Ждем завершения всех воркеров
-    for t in threads:
+    for t in worker_threads:
         t.join()
     
-    return success_achieved
+    # Неподходящие IP не должны оставаться в проекте на время паузы или после выхода
+    drain_cleanup()
+    
+    return success_result
 
 def main():
-    global work_start_time
+    setup_logging()
+    setup_notifications()
     
     # Проверка обязательных параметров
     if not SERVER_ID_OR_NAME:
@@ -497,67 +824,75 @@ def main():
     if WORKERS_COUNT < 1:
         raise SystemExit("❌ Количество воркеров должно быть >= 1")
     
+    if BATCH_SIZE < 1:
+        raise SystemExit("❌ Размер пакета VKCLOUD_BATCH_SIZE должен быть >= 1")
+    
     # Проверка параметров режима работы по расписанию
     if WORK_DURATION_MINUTES:
-        try:
-            work_duration = float(WORK_DURATION_MINUTES)
-            if work_duration <= 0:
-                raise SystemExit("❌ VKCLOUD_WORK_DURATION_MINUTES должно быть > 0")
-        except ValueError:
+        if WORK_DURATION is None:
             raise SystemExit("❌ VKCLOUD_WORK_DURATION_MINUTES должно быть числом")
+        if WORK_DURATION <= 0:
+            raise SystemExit("❌ VKCLOUD_WORK_DURATION_MINUTES должно быть > 0")
         
         if PAUSE_DURATION_MINUTES:
-            try:
-                pause_duration = float(PAUSE_DURATION_MINUTES)
-                if pause_duration < 0:
-                    raise SystemExit("❌ VKCLOUD_PAUSE_DURATION_MINUTES должно быть >= 0")
-            except ValueError:
+            if PAUSE_DURATION is None:
                 raise SystemExit("❌ VKCLOUD_PAUSE_DURATION_MINUTES должно быть числом")
+            if PAUSE_DURATION < 0:
+                raise SystemExit("❌ VKCLOUD_PAUSE_DURATION_MINUTES должно быть >= 0")
         else:
-            print("⚠️  Включен режим работы по расписанию, но не указана пауза. Будет бесконечный цикл работы.")
+            log.info("⚠️  Включен режим работы по расписанию, но не указана пауза. Будет бесконечный цикл работы.")
     
     # Отправляем уведомление о старте
     schedule_info = ""
     if WORK_DURATION_MINUTES:
         schedule_info = f" (режим работы: {WORK_DURATION_MINUTES} мин работа, {PAUSE_DURATION_MINUTES or 0} мин пауза)"
-    target_nets_str = ", ".join(str(net) for net in TARGET_NETS)
     send_notification(
         "VK Cloud: Запуск поиска Floating IP",
-        f"Запущено {WORKERS_COUNT} воркер(ов) для поиска IP в подсетях: {target_nets_str}{schedule_info}",
+        f"Запущено {WORKERS_COUNT} воркер(ов) для поиска IP в подсетях: {TARGET_NETS_DISPLAY}{schedule_info}",
         "info"
     )
     
-    print("🔗 Подключаюсь к VK Cloud (password auth)…")
-    conn = get_conn()
+    log.info("🔗 Подключаюсь к VK Cloud (password auth)…")
+    auth_config = get_auth()
+    sess = get_session(auth_config)
+    conn = get_conn(sess, auth_config)
 
-    # Ресурсы (получаем один раз для всех воркеров)
+    # Соединение и ресурсы (получаем один раз для всех воркеров)
     server = find_server(conn, SERVER_ID_OR_NAME)
     port = pick_port(conn, server, PORT_ID)
-    ext_net = find_external_network(conn, EXT_NET_NAME)
-
-    print(f"🖥️  ВМ: {server.name} ({server.id})")
-    print(f"🔌 Порт: {port.id}")
-    print(f"🌐 Внешняя сеть: {ext_net.name} ({ext_net.id})")
+    attached_ip = check_port_fips(conn, port)
+    if attached_ip:
+        log.info("✅ К порту %s уже привязан IP %s из целевых подсетей, искать нечего", port.id, attached_ip)
+        return 0
+    ext_net = find_external_network(conn, EXT_NET_NAME, auth_config["project_id"])
+
+    log.info("🖥️  ВМ: %s (%s)", server.name, server.id)
+    log.info("🔌 Порт: %s", port.id)
+    log.info("🌐 Внешняя сеть: %s (%s)", ext_net.name, ext_net.id)
     if len(TARGET_NETS) == 1:
-        print(f"🎯 Целевая подсеть: {TARGET_NETS[0]}")
+        log.info("🎯 Целевая подсеть: %s", TARGET_NETS[0])
     else:
-        print(f"🎯 Целевые подсети ({len(TARGET_NETS)}): {', '.join(str(net) for net in TARGET_NETS)}")
-    print(f"👷 Количество воркеров: {WORKERS_COUNT}")
+        log.info("🎯 Целевые подсети (%d): %s", len(TARGET_NETS), TARGET_NETS_DISPLAY)
+    log.info("👷 Количество воркеров: %d", WORKERS_COUNT)
+    log.info("🔗 Пул HTTP-соединений: до %d на хост", HTTP_POOL_MAXSIZE)
+    if BATCH_SIZE > 1:
+        log.info("📦 IP за одну попытку (на воркер): %d", BATCH_SIZE)
     
     try:
         # Основной цикл работы
         cycle_number = 1
         while True:
             if cycle_number > 1:
-                print(f"\n{'='*60}")
-                print(f"🔄 Цикл работы #{cycle_number}")
-                print(f"{'='*60}\n")
+                log.info("\n%s", "=" * 60)
+                log.info("🔄 Цикл работы #%d", cycle_number)
+                log.info("%s\n", "=" * 60)
             
             # Запускаем цикл работы
-            success = run_work_cycle(SERVER_ID_OR_NAME, port.id, ext_net.id)
+            result = run_work_cycle(SERVER_ID_OR_NAME, port.id, ext_net.id, conn, sess)
             
-            if success:
-                print(f"\n✅ Успешно завершено! IP {success_ip} привязан воркером {success_worker_id}")
+            if result:
+                success_ip, success_worker_id = result
+                log.info("\n✅ Успешно завершено! IP %s привязан воркером %s", success_ip, success_worker_id)
                 send_notification(
                     "VK Cloud: Floating IP найден и привязан",
                     f"IP {success_ip} успешно привязан к ВМ воркером {success_worker_id}",
@@ -566,9 +901,9 @@ def main():
                 return 0
             
             # Если включен режим работы по расписанию и время работы истекло
-            if WORK_DURATION_MINUTES and pause_event.is_set():
-                if not PAUSE_DURATION_MINUTES or float(PAUSE_DURATION_MINUTES) == 0:
-                    print("⚠️  Время работы истекло, но пауза не задана. Завершение работы.")
+            if WORK_DURATION is not None and pause_event.is_set():
+                if not PAUSE_DURATION:
+                    log.info("⚠️  Время работы истекло, но пауза не задана. Завершение работы.")
                     send_notification(
                         "VK Cloud: Время работы истекло",
                         f"Время работы ({WORK_DURATION_MINUTES} мин) истекло, пауза не задана. Завершение.",
@@ -576,8 +911,8 @@ def main():
                     )
                     return 1
                 
-                pause_seconds = float(PAUSE_DURATION_MINUTES) * 60
-                print(f"\n⏸️  Пауза на {PAUSE_DURATION_MINUTES} минут...")
+                pause_seconds = PAUSE_DURATION * 60
+                log.info("\n⏸️  Пауза на %s минут...", PAUSE_DURATION_MINUTES)
                 send_notification(
                     "VK Cloud: Пауза",
                     f"Время работы ({WORK_DURATION_MINUTES} мин) истекло. Пауза на {PAUSE_DURATION_MINUTES} мин.",
@@ -585,19 +920,13 @@ def main():
                 )
                 
                 # Ожидание паузы с возможностью прерывания
-                pause_start = time.time()
-                while time.time() - pause_start < pause_seconds:
-                    if stop_event.is_set():
-                        break
-                    time.sleep(1)
-                
-                if stop_event.is_set():
+                if stop_event.wait(pause_seconds):
                     break
                 
                 # Сбрасываем pause_event перед новым циклом
                 pause_event.clear()
                 
-                print(f"▶️  Пауза завершена, возобновляю работу...\n")
+                log.info("▶️  Пауза завершена, возобновляю работу...\n")
                 send_notification(
                     "VK Cloud: Возобновление работы",
                     f"Пауза завершена. Начинаю цикл работы #{cycle_number + 1}.",
@@ -606,7 +935,7 @@ def main():
                 cycle_number += 1
             else:
                 # Если режим работы по расписанию не включен, завершаем после первого цикла
-                print("⚠️ Все воркеры завершились, но успех не достигнут")
+                log.info("⚠️ Все воркеры завершились, но успех не достигнут")
                 send_notification(
                     "VK Cloud: Поиск завершен без результата",
                     "Все воркеры завершились, но подходящий IP не найден",
@@ -615,9 +944,13 @@ def main():
                 return 1
             
     except KeyboardInterrupt:
-        print("\n🛑 Остановлено пользователем.")
+        log.info("\n🛑 Остановлено пользователем.")
         stop_event.set()
         pause_event.set()
+        # Воркеры ещё могут удалять неподходящие IP — без ожидания они останутся в проекте
+        for t in worker_threads:
+            t.join()
+        drain_cleanup()
         send_notification(
             "VK Cloud: Поиск остановлен",
             "Поиск Floating IP остановлен пользователем",